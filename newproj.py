@@ -1,63 +1,153 @@
 import streamlit as st
+import math
+import time
 import numpy as np
-import matplotlib.pyplot as plt
+import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
 
 #api keys
 API_KEY_NREL = st.secrets["API_KEY_NREL"]
 API_KEY_TOMORROW = st.secrets["API_KEY_TOMORROW"]
 
+#(connect, read) timeout in seconds for every API call
+HTTP_TIMEOUT = (3, 5)
 
-#location lookup
+#seconds before a location with a failed or fallback lookup is fetched again
+LOCATION_RETRY_SECONDS = 60
+
+#raised by the cached API functions when a response payload is not in the expected shape
+class FetchError(Exception):
+    pass
+
+#shared http session
+@st.cache_resource
+def _http():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=16)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"User-Agent": "solar-calculator-app"})
+    return session
+
+
+@st.cache_resource
+def _executor():
+    return ThreadPoolExecutor(max_workers=4)
+
+
+#hours of the day and hourly irradiance profile (Gaussian centered at noon, sums to 1),
+#built once per process because Streamlit re-executes this script on every rerun
+@st.cache_resource
+def _hour_profile():
+    hours = np.arange(24)
+    profile = np.exp(-0.5 * ((hours - 12) / 4.0) ** 2)
+    profile /= profile.sum()
+    return hours, profile
+
+
+#location lookup (None for an unknown city or a failed request; failures are never cached)
 def get_coordinates_from_city(city_name):
     try:
-        response = requests.get(
-            "https://nominatim.openstreetmap.org/search",
-            params={"q": city_name + ", USA", "format": "json", "limit": 1},
-            headers={"User-Agent": "solar-calculator-app"}
-        )
-        response.raise_for_status()
+        return _geocode(city_name.strip().lower())
+    except (requests.RequestException, FetchError):
+        return None
+
+
+#coords rounded to 0.01° (~1 km), finer than the NREL grid, so nearby lookups share cache entries
+#raises on HTTP, transport or payload errors so only real answers are cached
+@st.cache_data(ttl=86400, max_entries=512, show_spinner=False)
+def _geocode(city_name):
+    response = _http().get(
+        "https://nominatim.openstreetmap.org/search",
+        params={"q": city_name + ", USA", "format": "json", "limit": 1},
+        timeout=HTTP_TIMEOUT
+    )
+    response.raise_for_status()
+    try:
         data = response.json()
         if data:
-            return {"lat": float(data[0]["lat"]), "lon": float(data[0]["lon"])}
+            return {"lat": round(float(data[0]["lat"]), 2), "lon": round(float(data[0]["lon"]), 2)}
         else:
             return None
-    except Exception as e:
-        return None
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        raise FetchError("unexpected Nominatim response") from e
 
 
-#daily irradiance
-@st.cache_data
-def fetch_daily_irradiance(location):
-    coords = get_coordinates_from_city(location)
-    if not coords:
-        return None
+#daily irradiance (multi-year average, persisted across restarts; persist="disk" does not support ttl)
+#raises on HTTP errors or a malformed payload so only real values reach the disk cache
+@st.cache_data(persist="disk", max_entries=2048, show_spinner=False)
+def fetch_daily_irradiance(coords):
     url = f"https://developer.nrel.gov/api/solar/solar_resource/v1.json?api_key={API_KEY_NREL}&lat={coords['lat']}&lon={coords['lon']}"
-    response = requests.get(url)
-    if response.status_code == 200:
-        try:
-            data = response.json()
-            ghi = data["outputs"]["avg_ghi"]["annual"]
-            return ghi  # in kWh/m²/day
-        except:
-            return None
-    else:
-        return None
+    response = _http().get(url, timeout=HTTP_TIMEOUT)
+    response.raise_for_status()
+    try:
+        data = response.json()
+        return float(data["outputs"]["avg_ghi"]["annual"])  # in kWh/m²/day
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        raise FetchError("unexpected NREL response") from e
 
-#temperature data
-@st.cache_data
-def fetch_tomorrow_temperature(location):
-    coords = get_coordinates_from_city(location)
+#temperature data (raises on failure, like fetch_daily_irradiance)
+@st.cache_data(ttl=1800, show_spinner=False)
+def fetch_tomorrow_temperature(coords):
     url = f"https://api.tomorrow.io/v4/weather/forecast?location={coords['lat']},{coords['lon']}&apikey={API_KEY_TOMORROW}"
-    response = requests.get(url)
-    if response.status_code == 200:
+    response = _http().get(url, timeout=HTTP_TIMEOUT)
+    response.raise_for_status()
+    try:
         data = response.json()
-        try:
-            return float(data["timelines"]["hourly"][0]["values"]["temperature"])
-        except:
-            return 25
-    return 25
+        return float(data["timelines"]["hourly"][0]["values"]["temperature"])
+    except (KeyError, IndexError, TypeError, ValueError) as e:
+        raise FetchError("unexpected Tomorrow.io response") from e
+
+#coords, irradiance and temperature for a city, with both API calls in flight at once,
+#plus a flag set when the temperature is the 25°C fallback rather than a forecast
+def fetch_location_bundle(location):
+    coords = get_coordinates_from_city(location)
+    if not coords:
+        return None, None, None, False
+    ghi_future = _executor().submit(fetch_daily_irradiance, coords)
+    temp_future = _executor().submit(fetch_tomorrow_temperature, coords)
+    # Failures fall back here, outside the caches, so the next rerun retries
+    try:
+        ghi_daily = ghi_future.result()
+    except (requests.RequestException, FetchError):
+        ghi_daily = None
+    temp_fallback = False
+    try:
+        temperature = temp_future.result()
+    except (requests.RequestException, FetchError):
+        temperature = 25
+        temp_fallback = True
+    return coords, ghi_daily, temperature, temp_fallback
+
+#location bundle kept in session state so slider reruns skip the fetch;
+#incomplete bundles are kept too, but refetched after LOCATION_RETRY_SECONDS
+def get_location_bundle(location):
+    key = f"loc:{location.strip().lower()}"
+    if key in st.session_state:
+        bundle, fetched_at = st.session_state[key]
+        coords, ghi_daily, temperature, temp_fallback = bundle
+        complete = coords is not None and ghi_daily is not None and not temp_fallback
+        if complete or time.monotonic() - fetched_at < LOCATION_RETRY_SECONDS:
+            return bundle
+    bundle = fetch_location_bundle(location)
+    st.session_state[key] = (bundle, time.monotonic())
+    return bundle
+
+#daily output of one m² of panel at 100% efficiency
+def _daily_kwh_per_m2(ghi_daily, temperature, tilt):
+    temp_factor = 1 - 0.004 * max(0, temperature - 25)
+    tilt_factor = math.sin(math.radians(tilt)) * 0.5 + 0.5
+    return ghi_daily * temp_factor * tilt_factor
+
+#hourly and total production in Wh, cached across reruns
+@st.cache_data(max_entries=256, show_spinner=False)
+def _compute(ghi, temp, eff, area, tilt):
+    daily_wh = _daily_kwh_per_m2(ghi, temp, tilt) * 1000 * eff * area
+    hourly = daily_wh * _hour_profile()[1]  # Wh each hour
+    return hourly, float(hourly.sum())
 
 #efficiency calculator
 class SolarCellCalculator:
@@ -67,24 +157,9 @@ class SolarCellCalculator:
         self.tilt_angle = tilt_angle
 
     def calculate_daily_production(self, daily_irradiance_kwh, temperature_C):
-        # Convert to Wh
-        daily_irradiance_wh = daily_irradiance_kwh * 1000
-
-        # Apply temperature and tilt
-        temp_factor = 1 - 0.004 * max(0, temperature_C - 25)
-        tilt_factor = np.sin(np.radians(self.tilt_angle)) * 0.5 + 0.5
-
-        # Simulate hourly profile (Gaussian centered at noon)
-        profile = np.exp(-0.5 * ((np.arange(24) - 12)/4)**2)
-        profile /= profile.sum()
-        hourly_irradiance = daily_irradiance_wh * profile  # Wh/m² each hour
-
-        # Calculate hourly production
-        hourly_production = [
-            irr * self.area_m2 * self.efficiency * temp_factor * tilt_factor
-            for irr in hourly_irradiance
-        ]
-        total_production = sum(hourly_production)
+        hourly_production, total_production = _compute(
+            daily_irradiance_kwh, temperature_C, self.efficiency, self.area_m2, self.tilt_angle
+        )
         return {
             'hourly_production': hourly_production,
             'total_production': total_production
@@ -130,10 +205,12 @@ tab1, tab2, tab3 = st.tabs(["📈 Solar Performance", "📐 Solar Sizing Tool","
 
 with tab1:
     st.sidebar.header("Solar Panel Inputs")
-    location = st.text_input("City of Residence:")
+    with st.form("tab1_loc"):
+        location = st.text_input("City of Residence:")
+        st.form_submit_button("Calculate")
 
     if location:
-        coords = get_coordinates_from_city(location)
+        coords, ghi_daily, temperature, temp_fallback = get_location_bundle(location)
         if not coords:
             st.error("No matching city found. Please enter a valid U.S. city name.")
             st.stop()
@@ -143,9 +220,6 @@ with tab1:
     tilt = st.sidebar.slider("Tilt Angle (degrees)", 0, 90, 30, key = "tilt_main")
 
     if location:
-        ghi_daily = fetch_daily_irradiance(location)
-        temperature = fetch_tomorrow_temperature(location)
-
         if ghi_daily is None:
             st.error("Failed to retrieve irradiance data.")
             st.stop()
@@ -172,38 +246,34 @@ with tab1:
         
 
         st.header("Energy Production in Kilowatt Hour")
-        st.metric("Total Daily Production", f"{result['total_production']:.2f} Wh", f"{result['total_production'] / 1000:.2f} kWh")
-        daily_kwh = result['total_production'] / 1000
-        annual_kwh = daily_kwh * 365
+        st.metric("Total Daily Production", f"{result['total_production']:.2f} Wh", f"{daily_kwh:.2f} kWh")
         st.metric("Estimated Annual Production", f"{annual_kwh:.2f} kWh")
 
 
-        fig, ax = plt.subplots(figsize=(7, 3.5))
-        hours = range(24)
-        ax.plot(hours, result['hourly_production'], label="Hourly Production", color='green')
-        ax.fill_between(hours, result['hourly_production'], color='green', alpha=0.3)
-        ax.set_xlabel("Hour")
-        ax.set_ylabel("Energy (Wh)")
-        ax.set_title(f"Simulated Hourly Solar Production\n{location} | Temp: {temperature}°C")
-        ax.grid(True)
-        st.pyplot(fig)
+        st.area_chart(
+            pd.DataFrame({"Wh": result['hourly_production']}, index=pd.Index(_hour_profile()[0], name="Hour")),
+            x_label="Hour", y_label="Energy (Wh)", color="#008000"
+        )
+        if temp_fallback:
+            st.caption(f"Simulated Hourly Solar Production | {location} | Temp: {temperature}°C (forecast unavailable, using default)")
+        else:
+            st.caption(f"Simulated Hourly Solar Production | {location} | Temp: {temperature}°C")
 
 with tab2:
     st.header("📐 Solar Sizing Tool")
     st.markdown("Estimate the ideal solar panel size based on your electricity usage goals.")
 
     st.sidebar.header("Sizing Inputs")
-    location_sizing = st.text_input("City for Sizing:", key="sizing_location")
+    with st.form("tab2_loc"):
+        location_sizing = st.text_input("City for Sizing:", key="sizing_location")
+        st.form_submit_button("Calculate")
 
     if location_sizing:
-        coords = get_coordinates_from_city(location_sizing)
+        coords, ghi_daily, temperature, temp_fallback = get_location_bundle(location_sizing)
         if not coords:
             st.error("No matching city found. Please enter a valid U.S. city name.")
             st.stop()
 
-        ghi_daily = fetch_daily_irradiance(location_sizing)
-        temperature = fetch_tomorrow_temperature(location_sizing)
-
         if ghi_daily is None:
             st.error("Failed to retrieve irradiance data.")
             st.stop()
@@ -216,8 +286,7 @@ with tab2:
 
         target_annual_kwh = monthly_usage * 12 * (offset_target / 100)
 
-        calculator_temp = SolarCellCalculator(efficiency=1, area_m2=1, tilt_angle=tilt)
-        base_output_per_m2 = calculator_temp.calculate_daily_production(ghi_daily, temperature)['total_production'] / 1000 * 365
+        base_output_per_m2 = _daily_kwh_per_m2(ghi_daily, temperature, tilt) * efficiency * 365
 
         if base_output_per_m2 == 0:
             st.error("Irradiance data returned 0. Cannot size the system.")
@@ -230,27 +299,29 @@ with tab2:
         st.markdown(f"-  **Target Annual Usage Offset**: `{target_annual_kwh:.0f} kWh/year`")
         st.markdown(f"-  **Estimated Panel Area Needed**: `{required_area:.2f} m²`")
         st.markdown(f"-  **System Efficiency**: `{efficiency*100:.0f}%` @ `{tilt}°` tilt")
-        st.markdown(f"-  **Weather-Based Estimate** at {temperature:.1f}°C")
+        if temp_fallback:
+            st.markdown(f"-  **Weather Forecast Unavailable**: estimate uses a default {temperature:.1f}°C")
+        else:
+            st.markdown(f"-  **Weather-Based Estimate** at {temperature:.1f}°C")
 
         st.info("This is a sizing estimate. Actual installation may vary based on roof shape, shading, and system losses.")
 with tab3:
     st.header("🌱 Environmental Impact")
 
-    location_env = st.text_input("City Name:", key="env_location")
+    with st.form("tab3_loc"):
+        location_env = st.text_input("City Name:", key="env_location")
+        st.form_submit_button("Calculate")
 
     if location_env:
-        coords = get_coordinates_from_city(location_env)
+        coords, ghi_daily, temperature, temp_fallback = get_location_bundle(location_env)
         if not coords:
             st.error("No matching city found. Please enter a valid U.S. city name.")
             st.stop()
 
-        ghi_daily = fetch_daily_irradiance(location_env)
         if ghi_daily is None:
             st.error("Failed to retrieve irradiance data.")
             st.stop()
 
-        temperature = fetch_tomorrow_temperature(location_env)
-
         efficiency = st.slider("Cell Efficiency (%)", 5, 30, 20, key="env_eff") / 100
         area = st.number_input("Panel Area (m²)", min_value=0.1, value=2.0, step=0.1, key="env_area")
         tilt = st.slider("Tilt Angle (degrees)", 0, 90, 30, key="env_tilt")